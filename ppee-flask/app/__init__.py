@@ -1,11 +1,13 @@
 import os
 import logging
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from celery import Celery
+from pytz import timezone as tz
 from config import config
 from app.utils.chunk_utils import calculate_chunks_total_size
 
@@ -15,6 +17,10 @@ migrate = Migrate()
 celery = Celery()
 login_manager = LoginManager()
 
+# Часовые пояса для фильтров шаблонов создаются один раз при импорте
+_UTC = tz('UTC')
+_MOSCOW = tz('Europe/Moscow')
+
 
 def create_app(config_name=None):
     """
@@ -76,6 +82,25 @@ def create_app(config_name=None):
     return app
 
 
+_task_app = None
+
+
+def get_task_app():
+    """
+    Возвращает приложение Flask для задач Celery.
+
+    Приложение создается один раз на процесс воркера и переиспользуется
+    всеми задачами этого процесса, вместо вызова create_app() в каждой задаче.
+
+    Returns:
+        Flask: Приложение Flask
+    """
+    global _task_app
+    if _task_app is None:
+        _task_app = create_app()
+    return _task_app
+
+
 def setup_logging(app):
     """Настройка логирования для приложения"""
     if not os.path.exists('logs'):
@@ -131,13 +156,10 @@ def register_template_filters(app):
     def to_moscow_time_filter(dt):
         """Конвертирует UTC время в московское"""
         if dt:
-            from pytz import timezone
-            utc = timezone('UTC')
-            moscow = timezone('Europe/Moscow')
             # Если datetime не имеет информации о часовом поясе, считаем что это UTC
             if dt.tzinfo is None:
-                dt = utc.localize(dt)
-            return dt.astimezone(moscow)
+                dt = _UTC.localize(dt)
+            return dt.astimezone(_MOSCOW)
         return dt
 
     @app.template_filter('strftime')
@@ -161,14 +183,11 @@ def register_template_filters(app):
         if not dt:
             return ''
 
-        from pytz import timezone as tz
-
         # Конвертируем в нужный часовой пояс
-        utc = tz('UTC')
-        target_tz = tz(timezone)
+        target_tz = _MOSCOW if timezone == 'Europe/Moscow' else tz(timezone)
 
         if dt.tzinfo is None:
-            dt = utc.localize(dt)
+            dt = _UTC.localize(dt)
 
         dt_converted = dt.astimezone(target_tz)
 
@@ -191,15 +210,11 @@ def register_template_filters(app):
         if not dt:
             return ''
 
-        from datetime import datetime
-        from pytz import timezone as tz
-
         # Конвертируем в московское время для правильного расчета
-        utc = tz('UTC')
-        moscow = tz(timezone)
+        moscow = _MOSCOW if timezone == 'Europe/Moscow' else tz(timezone)
 
         if dt.tzinfo is None:
-            dt = utc.localize(dt)
+            dt = _UTC.localize(dt)
 
         dt_moscow = dt.astimezone(moscow)
         now_moscow = datetime.now(moscow)
@@ -8,32 +8,36 @@ from datetime import datetime
 
 from app.utils.pdf_generator import generate_pdf_report, create_pdf_response
 from app import db
-from app.models import Application, File, Checklist, ParameterResult, User
+from app.models import Application, File, Checklist, ChecklistParameter, ParameterResult, User
 from app.blueprints.applications import bp
 from app.tasks.indexing_tasks import index_document_task
 from qdrant_client.http import models  # Прямой импорт для создания фильтров в Qdrant
 from app.services.fastapi_client import FastAPIClient
-from app.utils.db_utils import save_analysis_results  # Импортируем из utils
+from app.utils.db_utils import save_analysis_results, get_results_by_parameter  # Импортируем из utils
 from app.decorators import admin_required, prompt_engineer_required
 
 logger = logging.getLogger(__name__)
 
+# Максимальное количество чанков на одной странице просмотра
+CHUNKS_PER_PAGE = 1000
+
 
 def update_application_status(application):
     """Обновляет статус заявки на основе статусов файлов"""
-    file_statuses = [f.indexing_status for f in application.files]
+    status_counts = application.file_status_counts()
+    total_count = sum(status_counts.values())
+    errors_count = status_counts.get('error', 0)
+    completed_count = status_counts.get('completed', 0)
 
-    if not file_statuses:
+    if not total_count:
         application.status = 'created'
-    elif all(s == 'completed' for s in file_statuses):
+    elif completed_count == total_count:
         application.status = 'indexed'
-        application.status_message = f"Проиндексировано файлов: {len(file_statuses)}"
-    elif any(s == 'error' for s in file_statuses):
-        errors_count = file_statuses.count('error')
-        completed_count = file_statuses.count('completed')
+        application.status_message = f"Проиндексировано файлов: {total_count}"
+    elif errors_count:
         application.status = 'indexed' if completed_count > 0 else 'error'
         application.status_message = f"Успешно: {completed_count}, Ошибок: {errors_count}"
-    elif any(s == 'indexing' for s in file_statuses):
+    elif status_counts.get('indexing', 0):
         application.status = 'indexing'
     else:
         application.status = 'created'
@@ -329,10 +333,12 @@ def delete_file(id, file_id):
         return redirect(url_for('applications.view', id=application.id))
 
     try:
-        # Удаляем физический файл
-        if os.path.exists(file.file_path):
+        # Удаляем физический файл без отдельной проверки существования
+        try:
             os.remove(file.file_path)
             current_app.logger.info(f"Удален файл: {file.file_path}")
+        except FileNotFoundError:
+            pass
 
         # Удаляем чанки из векторного хранилища
         client = FastAPIClient()
@@ -520,13 +526,14 @@ def results(id):
 
         # Получаем результаты по чек-листам
         checklist_results = {}
+        results_by_parameter = get_results_by_parameter(application)
 
         for checklist in application.checklists:
             parameters = checklist.parameters.all()
             parameter_results = []
 
             for parameter in parameters:
-                result = parameter.results.filter_by(application_id=application.id).first()
+                result = results_by_parameter.get(parameter.id)
                 if result:
                     parameter_results.append({
                         'parameter': parameter,
@@ -567,8 +574,10 @@ def delete(id):
 
         # Удаляем файлы
         for file in application.files:
-            if os.path.exists(file.file_path):
+            try:
                 os.remove(file.file_path)
+            except FileNotFoundError:
+                pass
 
         # Удаляем данные из векторного хранилища через FastAPI
         client = FastAPIClient()
@@ -837,15 +846,20 @@ def view_chunks(id):
         # Получаем статистику
         stats = client.get_application_stats(str(application.id))
 
-        # Получаем чанки
-        chunks = client.get_application_chunks(str(application.id), limit=1000)
+        # Чанки показываем постранично, чтобы размер страницы оставался ограниченным
+        limit = min(max(request.args.get('limit', CHUNKS_PER_PAGE, type=int), 1), CHUNKS_PER_PAGE)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        chunks = client.get_application_chunks(str(application.id), limit=limit, offset=offset)
 
         return render_template('applications/chunks.html',
                                title=f'Чанки заявки {application.name}',
                                application=application,
                                chunks=chunks,
                                stats=stats,
-                               doc_names_mapping=doc_names_mapping)
+                               doc_names_mapping=doc_names_mapping,
+                               limit=limit,
+                               offset=offset,
+                               has_next=len(chunks) == limit)
     except Exception as e:
         current_app.logger.error(f"Ошибка при просмотре чанков заявки {id}: {str(e)}")
         flash(f"Ошибка при просмотре чанков: {str(e)}", "error")
@@ -948,12 +962,13 @@ def remove_checklist(id, checklist_id):
     if checklist in application.checklists:
         application.checklists.remove(checklist)
 
-        # Удаляем результаты анализа для параметров этого чек-листа
-        for parameter in checklist.parameters:
-            ParameterResult.query.filter_by(
-                application_id=application.id,
-                parameter_id=parameter.id
-            ).delete()
+        # Удаляем результаты анализа для параметров этого чек-листа одним запросом
+        parameter_ids = [parameter_id for (parameter_id,) in checklist.parameters.with_entities(ChecklistParameter.id)]
+        if parameter_ids:
+            ParameterResult.query.filter(
+                ParameterResult.application_id == application.id,
+                ParameterResult.parameter_id.in_(parameter_ids)
+            ).delete(synchronize_session=False)
 
         # Если заявка была проанализирована и остались другие чек-листы
         if application.status == 'analyzed' and application.checklists:
@@ -980,12 +995,13 @@ def api_stats(id):
         stats = client.get_application_stats(str(application.id))
 
         # Добавляем информацию о статусе заявки и файлов
+        status_counts = application.file_status_counts()
         files_info = {
-            'total': application.files.count(),
-            'completed': application.files.filter_by(indexing_status='completed').count(),
-            'indexing': application.files.filter_by(indexing_status='indexing').count(),
-            'error': application.files.filter_by(indexing_status='error').count(),
-            'pending': application.files.filter_by(indexing_status='pending').count()
+            'total': sum(status_counts.values()),
+            'completed': status_counts.get('completed', 0),
+            'indexing': status_counts.get('indexing', 0),
+            'error': status_counts.get('error', 0),
+            'pending': status_counts.get('pending', 0)
         }
 
         return jsonify({
@@ -1032,16 +1048,15 @@ def partial_results(id):
         checklist_results = {}
         total_results = 0
 
+        # ВАЖНО: Используем свежий запрос для получения результатов (один на все параметры)
+        results_by_parameter = get_results_by_parameter(application)
+
         for checklist in application.checklists:
             parameters = checklist.parameters.all()
             parameter_results = []
 
             for parameter in parameters:
-                # ВАЖНО: Используем свежий запрос для получения результатов
-                result = ParameterResult.query.filter_by(
-                    application_id=application.id,
-                    parameter_id=parameter.id
-                ).first()
+                result = results_by_parameter.get(parameter.id)
 
                 if result:
                     parameter_results.append({
@@ -1126,13 +1141,14 @@ def results_pdf(id):
 
         # Получаем результаты по чек-листам
         checklist_results = {}
+        results_by_parameter = get_results_by_parameter(application)
 
         for checklist in application.checklists:
             parameters = checklist.parameters.all()
             parameter_results = []
 
             for parameter in parameters:
-                result = parameter.results.filter_by(application_id=application.id).first()
+                result = results_by_parameter.get(parameter.id)
                 if result:
                     parameter_results.append({
                         'parameter': parameter,
@@ -130,9 +130,15 @@ def execute_search():
         # Проверяем права доступа для всех выбранных заявок
         applications = []
         doc_names_mapping = {}
-        
+
+        # Загружаем все выбранные заявки одним запросом
+        applications_by_id = {
+            application.id: application
+            for application in Application.query.filter(Application.id.in_(application_ids))
+        }
+
         for app_id in application_ids:
-            application = Application.query.get(app_id)
+            application = applications_by_id.get(app_id)
             
             if not application:
                 return jsonify({
@@ -66,6 +66,15 @@ class Application(db.Model):
 
         return status_map.get(self.status, self.status)
 
+    def file_status_counts(self):
+        """Возвращает количество файлов заявки по статусам индексации одним GROUP BY запросом"""
+        return dict(
+            db.session.query(File.indexing_status, db.func.count(File.id))
+            .filter(File.application_id == self.id)
+            .group_by(File.indexing_status)
+            .all()
+        )
+
     def get_document_names_mapping(self):
         """Возвращает маппинг document_id -> original_filename"""
         mapping = {}
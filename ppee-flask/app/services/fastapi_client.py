@@ -1,33 +1,93 @@
 import requests
 import logging
+import threading
+import time
 from typing import Dict, Any, List, Optional
 from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Размер пула keep-alive соединений к FastAPI
+HTTP_POOL_SIZE = 16
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Возвращает общую для процесса HTTP-сессию с пулом соединений к FastAPI"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # Повторяем идемпотентные запросы при кратковременной недоступности FastAPI.
+                # Таймауты чтения не повторяем: иначе зависший сервис многократно
+                # увеличивает время ответа коротких опросов (например, системной статистики)
+                retries = Retry(total=3, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                                raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                                      max_retries=retries)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def get_fastapi_url() -> str:
+    """Возвращает адрес FastAPI из конфигурации текущего приложения"""
+    return current_app.config.get('FASTAPI_URL', 'http://localhost:8001')
+
+
+# Кеш редко меняющихся ответов FastAPI на уровне процесса: {ключ: (время, значение)}
+_response_cache = {}
+
+# Список моделей меняется редко, поэтому не запрашиваем его при каждой загрузке страницы
+MODELS_CACHE_TTL = 60
+
+# Системную статистику опрашивает каждая открытая страница раз в 10 секунд,
+# поэтому несколько одновременных опросов обслуживаем одним запросом к FastAPI
+SYSTEM_STATS_CACHE_TTL = 5
+
+
+def _get_cached(key, ttl):
+    """Возвращает закешированное значение, если оно моложе ttl секунд"""
+    cached = _response_cache.get(key)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    return None
+
+
+def _set_cached(key, value):
+    """Сохраняет значение в кеш ответов"""
+    _response_cache[key] = (time.monotonic(), value)
+
 
 class FastAPIClient:
     """Клиент для работы с FastAPI сервисом"""
 
     def __init__(self, base_url: str = None):
-        self.base_url = base_url or current_app.config.get('FASTAPI_URL', 'http://localhost:8001')
+        self.base_url = base_url or get_fastapi_url()
+        self.session = get_http_session()
 
     def get_application_stats(self, application_id: str) -> Dict[str, Any]:
         """Получает статистику по заявке"""
         try:
-            response = requests.get(f"{self.base_url}/applications/{application_id}/stats")
+            response = self.session.get(f"{self.base_url}/applications/{application_id}/stats")
             response.raise_for_status()
             return response.json()["stats"]
         except Exception as e:
             logger.error(f"Ошибка получения статистики: {e}")
             raise
 
-    def get_application_chunks(self, application_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
-        """Получает чанки заявки"""
+    def get_application_chunks(self, application_id: str, limit: int = 1000, offset: int = 0) -> List[Dict[str, Any]]:
+        """Получает чанки заявки (одну страницу, начиная с offset)"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/applications/{application_id}/chunks",
-                params={"limit": limit}
+                params={"limit": limit, "offset": offset}
             )
             response.raise_for_status()
             return response.json()["chunks"]
@@ -38,7 +98,7 @@ class FastAPIClient:
     def delete_application_data(self, application_id: str) -> bool:
         """Удаляет данные заявки из векторного хранилища"""
         try:
-            response = requests.delete(f"{self.base_url}/applications/{application_id}")
+            response = self.session.delete(f"{self.base_url}/applications/{application_id}")
             response.raise_for_status()
             return True
         except Exception as e:
@@ -48,7 +108,7 @@ class FastAPIClient:
     def delete_document_chunks(self, application_id: str, document_id: str) -> int:
         """Удаляет чанки конкретного документа из векторного хранилища"""
         try:
-            response = requests.delete(
+            response = self.session.delete(
                 f"{self.base_url}/applications/{application_id}/documents/{document_id}"
             )
             response.raise_for_status()
@@ -61,7 +121,7 @@ class FastAPIClient:
     def delete_file_chunks(self, application_id: str, file_id: str) -> int:
         """Удаляет чанки по file_id"""
         try:
-            response = requests.delete(
+            response = self.session.delete(
                 f"{self.base_url}/applications/{application_id}/files/{file_id}/chunks"
             )
             response.raise_for_status()
@@ -74,7 +134,7 @@ class FastAPIClient:
     def search(self, application_id: str, query: str, **kwargs) -> List[Dict[str, Any]]:
         """Выполняет поиск"""
         try:
-            response = requests.post(f"{self.base_url}/search", json={
+            response = self.session.post(f"{self.base_url}/search", json={
                 "application_id": application_id,
                 "query": query,
                 **kwargs
@@ -88,7 +148,7 @@ class FastAPIClient:
     def index_document(self, task_id: str, application_id: str, document_path: str, delete_existing: bool = False):
         """Запускает индексацию документа"""
         try:
-            response = requests.post(f"{self.base_url}/index", json={
+            response = self.session.post(f"{self.base_url}/index", json={
                 "task_id": task_id,
                 "application_id": application_id,
                 "document_path": document_path,
@@ -103,7 +163,7 @@ class FastAPIClient:
     def analyze_application(self, task_id: str, application_id: str, checklist_items: List[Dict], llm_params: Dict):
         """Запускает анализ заявки"""
         try:
-            response = requests.post(f"{self.base_url}/analyze", json={
+            response = self.session.post(f"{self.base_url}/analyze", json={
                 "task_id": task_id,
                 "application_id": application_id,
                 "checklist_items": checklist_items,
@@ -117,15 +177,22 @@ class FastAPIClient:
 
     def get_llm_models(self) -> List[str]:
         """Получает список доступных LLM моделей"""
+        cache_key = (self.base_url, 'models')
+        cached = _get_cached(cache_key, MODELS_CACHE_TTL)
+        if cached is not None:
+            return list(cached)
+
         try:
-            response = requests.get(f"{self.base_url}/llm/models")
+            response = self.session.get(f"{self.base_url}/llm/models")
             response.raise_for_status()
             all_models = response.json()["models"]
 
             # Фильтруем модель bge-m3:latest
             llm_models = [model for model in all_models if model != 'bge-m3:latest']
 
-            return llm_models
+            if llm_models:
+                _set_cached(cache_key, llm_models)
+            return list(llm_models)
 
         except Exception as e:
             logger.error(f"Ошибка получения моделей: {e}")
@@ -136,7 +203,7 @@ class FastAPIClient:
     def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """Получает статус задачи"""
         try:
-            response = requests.get(f"{self.base_url}/task/{task_id}/status")  # Исправлено: task вместо tasks
+            response = self.session.get(f"{self.base_url}/task/{task_id}/status")  # Исправлено: task вместо tasks
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -146,7 +213,7 @@ class FastAPIClient:
     def get_task_results(self, task_id: str) -> Dict[str, Any]:
         """Получает результаты выполненной задачи"""
         try:
-            response = requests.get(f"{self.base_url}/task/{task_id}/results")  # Исправлено: task вместо tasks
+            response = self.session.get(f"{self.base_url}/task/{task_id}/results")  # Исправлено: task вместо tasks
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -155,10 +222,17 @@ class FastAPIClient:
 
     def get_system_stats(self) -> Dict[str, Any]:
         """Получает статистику использования системных ресурсов"""
+        cache_key = (self.base_url, 'system_stats')
+        cached = _get_cached(cache_key, SYSTEM_STATS_CACHE_TTL)
+        if cached is not None:
+            return cached
+
         try:
-            response = requests.get(f"{self.base_url}/api/v1/system/stats", timeout=2)
+            response = self.session.get(f"{self.base_url}/api/v1/system/stats", timeout=2)
             response.raise_for_status()
-            return response.json()
+            stats = response.json()
+            _set_cached(cache_key, stats)
+            return stats
         except Exception as e:
             logger.error(f"Ошибка получения системной статистики: {e}")
             # Возвращаем значения по умолчанию при ошибке
@@ -173,13 +247,21 @@ class FastAPIClient:
 
     def get_llm_models_info(self) -> Dict[str, Dict[str, Any]]:
         """Получает информацию о всех LLM моделях"""
+        cache_key = (self.base_url, 'models_info')
+        cached = _get_cached(cache_key, MODELS_CACHE_TTL)
+        if cached is not None:
+            return dict(cached)
+
         try:
-            response = requests.get(f"{self.base_url}/llm/models/info")
+            response = self.session.get(f"{self.base_url}/llm/models/info")
             response.raise_for_status()
             data = response.json()
 
             if data.get("status") == "success":
-                return data.get("models", {})
+                models_info = data.get("models", {})
+                if models_info:
+                    _set_cached(cache_key, models_info)
+                return dict(models_info)
 
             return {}
 
@@ -190,8 +272,8 @@ class FastAPIClient:
     def get_model_details(self, model_name: str) -> Dict[str, Any]:
         """Получает детальную информацию о конкретной модели"""
         try:
-            response = requests.post(f"{self.base_url}/llm/model/show",
-                                     params={"model_name": model_name})
+            response = self.session.post(f"{self.base_url}/llm/model/show",
+                                         params={"model_name": model_name})
             response.raise_for_status()
             return response.json()
 
@@ -203,7 +285,7 @@ class FastAPIClient:
                           parameters: Dict[str, Any], query: Optional[str] = None) -> Dict[str, Any]:
         """Обрабатывает запрос через LLM"""
         try:
-            response = requests.post(f"{self.base_url}/llm/process", json={
+            response = self.session.post(f"{self.base_url}/llm/process", json={
                 "model_name": model_name,
                 "prompt": prompt,
                 "context": context,
@@ -1,7 +1,7 @@
-from app import celery, db, create_app
+from app import celery, db, get_task_app
 from app.models import Application, File
+from app.services.fastapi_client import get_http_session, get_fastapi_url
 import logging
-import requests
 import time
 import uuid
 import os
@@ -9,23 +9,21 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-FASTAPI_URL = "http://localhost:8001"
-
 
 def update_application_status(application):
     """Обновляет статус заявки на основе статусов файлов"""
-    file_statuses = [f.indexing_status for f in application.files]
+    status_counts = application.file_status_counts()
+    total_count = sum(status_counts.values())
+    errors_count = status_counts.get('error', 0)
+    completed_count = status_counts.get('completed', 0)
 
-    if not file_statuses:
+    if not total_count:
         application.status = 'created'
-    elif any(s == 'indexing' for s in file_statuses):
+    elif status_counts.get('indexing', 0):
         # Хотя бы один файл еще индексируется
         application.status = 'indexing'
-    elif any(s == 'error' for s in file_statuses):
-        # Есть файлы с ошибками (приоритет над успешной индексацией)
-        errors_count = file_statuses.count('error')
-        completed_count = file_statuses.count('completed')
-
+    elif errors_count:
+        # Есть файлы с ошибками (приоритет над успешной индексацией).
         # Всегда устанавливаем статус 'error' если есть хотя бы одна ошибка
         application.status = 'error'
         application.last_operation = 'indexing'  # Добавляем, чтобы знать, что ошибка при индексации
@@ -34,10 +32,10 @@ def update_application_status(application):
             application.status_message = f"Индексация завершена с ошибками. Успешно: {completed_count}, Ошибок: {errors_count}"
         else:
             application.status_message = f"Ошибка индексации всех файлов ({errors_count})"
-    elif all(s == 'completed' for s in file_statuses):
+    elif completed_count == total_count:
         # Все файлы успешно проиндексированы
         application.status = 'indexed'
-        application.status_message = f"Успешно проиндексировано файлов: {len(file_statuses)}"
+        application.status_message = f"Успешно проиндексировано файлов: {total_count}"
     else:
         application.status = 'created'
 
@@ -47,8 +45,8 @@ def update_application_status(application):
 def get_file_chunks_count(application_id, file_id):
     """Получает количество чанков для файла через FastAPI"""
     try:
-        response = requests.get(
-            f"{FASTAPI_URL}/applications/{application_id}/files/{file_id}/stats"
+        response = get_http_session().get(
+            f"{get_fastapi_url()}/applications/{application_id}/files/{file_id}/stats"
         )
         if response.status_code == 200:
             return response.json().get('chunks_count', 0)
@@ -61,9 +59,12 @@ def get_file_chunks_count(application_id, file_id):
 def index_document_task(self, application_id, file_id):
     """Асинхронная задача для индексации документа через FastAPI"""
     # Создаем контекст приложения для работы с БД
-    app = create_app()
+    app = get_task_app()
 
     with app.app_context():
+        # Адрес FastAPI берем из конфигурации запущенного приложения
+        fastapi_url = get_fastapi_url()
+
         # Получаем данные из БД
         application = Application.query.get(application_id)
         file = File.query.get(file_id)
@@ -139,7 +140,7 @@ def index_document_task(self, application_id, file_id):
             )
 
             # Отправляем запрос в FastAPI для начала индексации
-            response = requests.post(f"{FASTAPI_URL}/index", json={
+            response = get_http_session().post(f"{fastapi_url}/index", json={
                 "task_id": task_id,
                 "application_id": str(application_id),
                 "document_path": file.file_path,
@@ -159,7 +160,7 @@ def index_document_task(self, application_id, file_id):
 
                 while attempt < max_attempts:
                     # Получаем статус задачи через FastAPI
-                    status_response = requests.get(f"{FASTAPI_URL}/tasks/{task_id}/status")
+                    status_response = get_http_session().get(f"{fastapi_url}/tasks/{task_id}/status")
 
                     if status_response.status_code == 200:
                         status_data = status_response.json()
@@ -1,15 +1,15 @@
-from app import celery, db, create_app
+from app import celery, db, get_task_app
 from app.models import Application, ParameterResult
-from app.utils.llm_parser import LLMResponseParser
+from app.services.fastapi_client import get_http_session, get_fastapi_url
+from app.utils.chunk_utils import format_chunk_source, format_documents_for_context
+from app.utils.llm_parser import LLMResponseParser, extract_value_from_response, calculate_confidence
 from datetime import datetime
 import logging
-import requests
 import time
 import re
 from celery.exceptions import Terminated, WorkerLostError
 
 logger = logging.getLogger(__name__)
-FASTAPI_URL = "http://localhost:8001"
 
 
 def save_single_result(application_id, parameter_id, result_data):
@@ -53,10 +53,12 @@ def get_all_chunks_for_application(application_id, batch_size=100):
     try:
         offset = 0
         all_chunks = []
+        # Уровень логирования проверяем один раз, а не для каждого пропущенного чанка
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
 
         while True:
-            response = requests.get(
-                f"{FASTAPI_URL}/applications/{application_id}/chunks",
+            response = get_http_session().get(
+                f"{get_fastapi_url()}/applications/{application_id}/chunks",
                 params={"limit": batch_size, "offset": offset}
             )
 
@@ -73,11 +75,12 @@ def get_all_chunks_for_application(application_id, batch_size=100):
             # Фильтруем чанки с нулевой длиной контента
             valid_chunks = []
             for chunk in chunks:
-                content_length = chunk.get('metadata', {}).get('content_length', 0)
+                metadata = chunk.get('metadata', {})
+                content_length = metadata.get('content_length', 0)
                 if content_length > 0:
                     valid_chunks.append(chunk)
-                else:
-                    logger.debug(f"Пропущен чанк с нулевой длиной при загрузке: {chunk.get('metadata', {}).get('chunk_id', 'unknown')}")
+                elif debug_enabled:
+                    logger.debug(f"Пропущен чанк с нулевой длиной при загрузке: {metadata.get('chunk_id', 'unknown')}")
             
             all_chunks.extend(valid_chunks)
             offset += batch_size
@@ -111,7 +114,7 @@ def process_chunks_batch_through_llm(chunks_batch, param_data, model_name):
         )
 
         # Отправляем запрос к LLM
-        llm_response = requests.post(f"{FASTAPI_URL}/llm/process", json={
+        llm_response = get_http_session().post(f"{get_fastapi_url()}/llm/process", json={
             "model_name": model_name,
             "prompt": prompt,
             "context": "",  # Контекст уже включен в промпт
@@ -158,6 +161,7 @@ def group_chunks_by_size(chunks, max_size=14000):
     batches = []
     current_batch = []
     current_size = 0
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
 
     for chunk in chunks:
         # Получаем размер контента из метаданных
@@ -166,7 +170,8 @@ def group_chunks_by_size(chunks, max_size=14000):
 
         # Пропускаем чанки с нулевой длиной контента
         if content_length == 0:
-            logger.debug(f"Пропущен чанк с нулевой длиной контента: {metadata.get('chunk_id', 'unknown')}")
+            if debug_enabled:
+                logger.debug(f"Пропущен чанк с нулевой длиной контента: {metadata.get('chunk_id', 'unknown')}")
             continue
 
         # Если нет content_length или он отрицательный, обрабатываем чанк отдельно
@@ -204,92 +209,12 @@ def format_single_chunk_for_context(chunk):
     metadata = chunk.get('metadata', {})
 
     # Формируем структурированный контекст с метаданными
-    doc_text = f"[Источник: "
-
-    # Добавляем название документа
-    if metadata.get('document_name'):
-        doc_text += f"Документ: {metadata['document_name']}"
-    elif metadata.get('document_id'):
-        doc_text += f"Документ ID: {metadata['document_id']}"
-
-    # Добавляем страницу
-    if metadata.get('page_number'):
-        doc_text += f", Страница: {metadata['page_number']}"
-    elif metadata.get('page_numbers'):
-        pages = metadata['page_numbers']
-        if isinstance(pages, list) and pages:
-            doc_text += f", Страницы: {', '.join(map(str, pages))}"
-
-    # Добавляем номер чанка
-    if metadata.get('chunk_index') is not None:
-        doc_text += f", Чанк: {metadata['chunk_index']}"
-    elif metadata.get('chunk_id'):
-        doc_text += f", Чанк: {metadata['chunk_id']}"
-
-    # Раздел убран из вывода для упрощения контекста
-
-    doc_text += "]\n"
+    doc_text = format_chunk_source(metadata) + "\n"
     doc_text += f"{text}\n"
 
     return doc_text
 
 
-def format_documents_for_context(search_results):
-    """Форматирует найденные документы для контекста LLM с метаданными"""
-    context_parts = []
-    for i, doc in enumerate(search_results, 1):
-        metadata = doc.get('metadata', {})
-
-        # Формируем заголовок с метаданными
-        doc_text = f"===== Результат {i} =====\n"
-        doc_text += f"[Источник: "
-
-        # Добавляем название документа
-        if metadata.get('document_name'):
-            doc_text += f"Документ: {metadata['document_name']}"
-        elif metadata.get('document_id'):
-            doc_text += f"Документ ID: {metadata['document_id']}"
-
-        # Добавляем страницу
-        if metadata.get('page_number'):
-            doc_text += f", Страница: {metadata['page_number']}"
-        elif metadata.get('page_numbers'):
-            pages = metadata['page_numbers']
-            if isinstance(pages, list) and pages:
-                doc_text += f", Страницы: {', '.join(map(str, pages))}"
-
-        # Добавляем номер чанка
-        if metadata.get('chunk_index') is not None:
-            doc_text += f", Чанк: {metadata['chunk_index']}"
-        elif metadata.get('chunk_id'):
-            doc_text += f", Чанк: {metadata['chunk_id']}"
-
-        # Раздел убран из вывода для упрощения контекста
-
-        doc_text += "]\n\n"
-
-        # Добавляем текст
-        doc_text += f"{doc['text']}\n"
-        doc_text += "=" * 30 + "\n"
-
-        context_parts.append(doc_text)
-
-    return "\n".join(context_parts)
-
-
-def extract_value_from_response(response, query):
-    """Извлекает значение из ответа LLM с поддержкой различных форматов"""
-    parser = LLMResponseParser()
-    result = parser.parse_response(response, query)
-
-    # Логируем результат парсинга для отладки
-    logger.debug(f"Парсинг ответа LLM: формат={result.get('format')}, уверенность={result.get('confidence')}")
-    if 'formats_tried' in result:
-        logger.debug(f"Попробованные форматы: {result['formats_tried']}")
-
-    return result['value']
-
-
 def parse_llm_response_full(response, query):
     """Парсит полный ответ LLM и возвращает все данные включая источник"""
     parser = LLMResponseParser()
@@ -307,17 +232,10 @@ def parse_llm_response_full(response, query):
     }
 
 
-def calculate_confidence(response):
-    """Рассчитывает уверенность в ответе"""
-    parser = LLMResponseParser()
-    return parser._calculate_confidence(response)
-
-
 def check_if_cancelled(celery_task):
     """Проверяет, была ли задача отменена"""
     try:
-        from celery import current_app as celery_app
-        task_state = celery_app.AsyncResult(celery_task.request.id).state
+        task_state = celery.AsyncResult(celery_task.request.id).state
         return task_state == 'REVOKED'
     except:
         return False
@@ -354,9 +272,12 @@ def handle_cancellation(application_id):
 def process_parameters_task(self, application_id):
     """Трехэтапная обработка: поиск, LLM, и полное сканирование при необходимости"""
     # Создаем контекст приложения для работы с БД
-    app = create_app()
+    app = get_task_app()
 
     with app.app_context():
+        # Адрес FastAPI берем из конфигурации запущенного приложения
+        fastapi_url = get_fastapi_url()
+
         # Используем свежий запрос к БД для избежания проблем с кешированием
         application = db.session.query(Application).filter_by(id=application_id).first()
 
@@ -401,6 +322,10 @@ def process_parameters_task(self, application_id):
             prepared_requests = {}  # {param_id: {search_results, prompt, model, ...}}
             params_need_full_scan = []  # Параметры для полного сканирования
 
+            # Параметры разных чек-листов часто ищут одно и то же, поэтому
+            # результаты одинаковых поисковых запросов переиспользуем в рамках задачи
+            search_cache = {}  # {(query, limit, use_reranker, rerank_limit): (search_results, context)}
+
             # Выполняем поиск для каждого параметра
             for i, param in enumerate(all_params):
                 # Обновляем прогресс
@@ -419,24 +344,36 @@ def process_parameters_task(self, application_id):
                 try:
                     # Приводим поисковый запрос к нижнему регистру для улучшения поиска
                     search_query_lower = param.search_query.lower() if param.search_query else param.search_query
-                    
-                    search_response = requests.post(f"{FASTAPI_URL}/search", json={
-                        "application_id": str(application_id),
-                        "query": search_query_lower,  # Используем нижний регистр для поиска
-                        "limit": param.search_limit,
-                        "use_reranker": param.use_reranker,
-                        "rerank_limit": param.rerank_limit if param.use_reranker else None,
-                        "use_smart_search": True,
-                        "vector_weight": 0.5,
-                        "text_weight": 0.5,
-                        "hybrid_threshold": app.config.get('DEFAULT_HYBRID_THRESHOLD', 10)
-                    })
-
-                    if search_response.status_code == 200:
-                        search_results = search_response.json()["results"]
-
-                        # Форматируем контекст
-                        context = format_documents_for_context(search_results)
+                    rerank_limit = param.rerank_limit if param.use_reranker else None
+                    search_key = (search_query_lower, param.search_limit, param.use_reranker, rerank_limit)
+
+                    cached_search = search_cache.get(search_key)
+                    if cached_search is None:
+                        search_response = get_http_session().post(f"{fastapi_url}/search", json={
+                            "application_id": str(application_id),
+                            "query": search_query_lower,  # Используем нижний регистр для поиска
+                            "limit": param.search_limit,
+                            "use_reranker": param.use_reranker,
+                            "rerank_limit": rerank_limit,
+                            "use_smart_search": True,
+                            "vector_weight": 0.5,
+                            "text_weight": 0.5,
+                            "hybrid_threshold": app.config.get('DEFAULT_HYBRID_THRESHOLD', 10)
+                        })
+
+                        if search_response.status_code == 200:
+                            search_results = search_response.json()["results"]
+
+                            # Форматируем контекст
+                            context = format_documents_for_context(search_results)
+                            cached_search = search_cache[search_key] = (search_results, context)
+                        else:
+                            logger.error(f"Ошибка поиска для параметра {param.id}: {search_response.text}")
+                    else:
+                        logger.info(f"Повторный поисковый запрос для параметра {param.id}, используем готовые результаты")
+
+                    if cached_search is not None:
+                        search_results, context = cached_search
 
                         # Используем правильный запрос для LLM
                         llm_query = param.get_llm_query() if hasattr(param,
@@ -462,8 +399,6 @@ def process_parameters_task(self, application_id):
                         }
 
                         logger.info(f"Поиск завершен для параметра {param.id}: {param.name}")
-                    else:
-                        logger.error(f"Ошибка поиска для параметра {param.id}: {search_response.text}")
 
                 except Exception as e:
                     logger.error(f"Ошибка при поиске для параметра {param.id}: {e}")
@@ -497,6 +432,7 @@ def process_parameters_task(self, application_id):
 
             # Обрабатываем каждую группу
             completed_params = 0
+            llm_cache = {}  # {(model, prompt, temperature, max_tokens, llm_query): ответ FastAPI}
 
             for model_name, param_group in model_groups.items():
                 logger.info(f"Обработка {len(param_group)} параметров через модель {model_name}")
@@ -515,25 +451,41 @@ def process_parameters_task(self, application_id):
                 # Обрабатываем каждый параметр в группе
                 for param_id, data in param_group:
                     try:
-                        # Отправляем запрос к LLM
-                        llm_response = requests.post(f"{FASTAPI_URL}/llm/process", json={
-                            "model_name": model_name,
-                            "prompt": data['prompt'],
-                            "context": "",  # Контекст уже включен в промпт
-                            "parameters": {
-                                'temperature': data['temperature'],
-                                'max_tokens': data['max_tokens'],
-                                'search_query': data['llm_query']
-                            },
-                            "query": data['llm_query']
-                        })
-
-                        if llm_response.status_code == 200:
-                            llm_response_data = llm_response.json()
+                        # Одинаковый промпт с теми же настройками даст тот же ответ,
+                        # поэтому повторно модель не вызываем
+                        llm_key = (model_name, data['prompt'], data['temperature'],
+                                   data['max_tokens'], data['llm_query'])
+                        llm_response_data = llm_cache.get(llm_key)
+                        from_cache = llm_response_data is not None
+
+                        if not from_cache:
+                            # Отправляем запрос к LLM
+                            llm_response = get_http_session().post(f"{fastapi_url}/llm/process", json={
+                                "model_name": model_name,
+                                "prompt": data['prompt'],
+                                "context": "",  # Контекст уже включен в промпт
+                                "parameters": {
+                                    'temperature': data['temperature'],
+                                    'max_tokens': data['max_tokens'],
+                                    'search_query': data['llm_query']
+                                },
+                                "query": data['llm_query']
+                            })
+
+                            if llm_response.status_code == 200:
+                                llm_response_data = llm_cache[llm_key] = llm_response.json()
+                        else:
+                            logger.info(f"Повторный запрос к LLM для параметра {param_id}, используем готовый ответ")
+
+                        if llm_response_data is not None:
                             llm_text = llm_response_data["response"]
                             
                             # ДОБАВЛЕНО: Извлечение информации о токенах
-                            tokens_info = llm_response_data.get("tokens", {})
+                            if from_cache:
+                                # Готовый ответ повторно токены не тратит
+                                tokens_info = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                            else:
+                                tokens_info = llm_response_data.get("tokens", {})
 
                             # Извлекаем полный результат парсинга
                             parsed_result = parse_llm_response_full(llm_text, data['llm_query'])
@@ -548,7 +500,8 @@ def process_parameters_task(self, application_id):
                                     'data': data,
                                     'initial_search_results': data['search_results'],
                                     'initial_llm_response': llm_text,
-                                    'initial_tokens': tokens_info  # ДОБАВЛЕНО: сохраняем токены
+                                    'initial_tokens': tokens_info,  # ДОБАВЛЕНО: сохраняем токены
+                                    'cached': from_cache
                                 })
                                 logger.info(f"Параметр {param_id} добавлен для полного сканирования")
                             else:
@@ -567,6 +520,7 @@ def process_parameters_task(self, application_id):
                                         'search_query': data['search_query'],
                                         'llm_query': data['llm_query'],
                                         'tokens': tokens_info,  # ДОБАВЛЕНО: сохраняем токены
+                                        'cached': from_cache,  # Ответ взят из кеша без вызова модели
                                         # Сохраняем информацию об источнике, если LLM вернул её
                                         'source_document': parsed_result.get('document'),
                                         'source_page': parsed_result.get('page'),
@@ -734,7 +688,8 @@ def process_parameters_task(self, application_id):
                                 'chunks_scanned': total_chunks,
                                 'batches_processed': total_batches,
                                 'full_scan_result': 'not_found',
-                                'tokens': param_info.get('initial_tokens', {})  # ДОБАВЛЕНО: используем сохраненные токены
+                                'tokens': param_info.get('initial_tokens', {}),  # ДОБАВЛЕНО: используем сохраненные токены
+                                'cached': param_info.get('cached', False)
                             }
                         }
 
@@ -1,13 +1,16 @@
-from app import celery, create_app
-from app.utils.llm_parser import LLMResponseParser
+from app import celery, get_task_app
+from app.services.fastapi_client import get_http_session, get_fastapi_url
+from app.utils.chunk_utils import format_documents_for_context
+from app.utils.llm_parser import extract_value_from_response, calculate_confidence
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import requests
 import time
 from celery.exceptions import Terminated, WorkerLostError
 
 logger = logging.getLogger(__name__)
 
-FASTAPI_URL = "http://localhost:8001"
+# Ограничение параллельных поисковых запросов к одному сервису FastAPI
+MAX_PARALLEL_SEARCHES = 4
 
 
 @celery.task(bind=True)
@@ -18,9 +21,12 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
                          multi_search=False):
     """Асинхронная задача для семантического поиска через FastAPI с поддержкой отмены"""
     # Создаем контекст приложения для работы с БД
-    app = create_app()
+    app = get_task_app()
 
     with app.app_context():
+        # Адрес FastAPI берем из конфигурации запущенного приложения
+        fastapi_url = get_fastapi_url()
+
         task_id = self.request.id
         start_time = time.time()
 
@@ -45,20 +51,29 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
 
             if use_reranker and rerank_limit == 9999:
                 # Для множественного поиска суммируем чанки всех заявок
-                total_chunks = 0
-                for app_id in search_app_ids:
+                session = get_http_session()
+
+                def get_application_chunks_count(app_id):
+                    """Возвращает количество чанков заявки (вызывается из пула потоков)"""
                     try:
                         logger.info(f"Получение количества чанков для заявки {app_id}")
-                        response = requests.get(f"{FASTAPI_URL}/applications/{app_id}/stats")
+                        response = session.get(f"{fastapi_url}/applications/{app_id}/stats")
                         if response.status_code == 200:
                             stats = response.json()["stats"]
                             app_chunks = stats.get("total_points", 100)  # fallback на 100
-                            total_chunks += app_chunks
                             logger.info(f"Заявка {app_id}: {app_chunks} чанков")
+                            return app_chunks
                     except Exception as e:
                         logger.error(f"Ошибка при получении статистики заявки {app_id}: {e}")
-                        total_chunks += 100  # fallback для этой заявки
-                
+                        return 100  # fallback для этой заявки
+                    return 0
+
+                # Статистику по заявкам запрашиваем параллельно, с тем же ограничением,
+                # что и поисковые запросы к FastAPI
+                max_workers = min(len(search_app_ids), MAX_PARALLEL_SEARCHES) or 1
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    total_chunks = sum(executor.map(get_application_chunks_count, search_app_ids))
+
                 rerank_limit = total_chunks if total_chunks > 0 else 1000
                 logger.info(f"Использование всех {rerank_limit} чанков для ререйтинга")
 
@@ -103,11 +118,12 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
             
             if multi_search and len(search_app_ids) > 1:
                 # Множественный поиск - сохраняем результаты по каждой заявке отдельно
-                search_results_by_app = []
-                
-                for app_id in search_app_ids:
+                session = get_http_session()
+
+                def search_in_application(app_id):
+                    """Выполняет поиск по одной заявке (вызывается из пула потоков)"""
                     try:
-                        response = requests.post(f"{FASTAPI_URL}/search", json={
+                        response = session.post(f"{fastapi_url}/search", json={
                             "application_id": str(app_id),
                             "query": query_text_lower,
                             "limit": limit,  # Каждая заявка получает полный лимит результатов
@@ -118,30 +134,45 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
                             "text_weight": text_weight,
                             "hybrid_threshold": hybrid_threshold
                         })
-                        
+
                         if response.status_code == 200:
                             results = response.json()["results"]
                             # Добавляем информацию о заявке в метаданные
                             for result in results:
                                 result['application_id'] = app_id
-                            # Сохраняем результаты с информацией о заявке
-                            if results:
-                                search_results_by_app.append({
-                                    'application_id': app_id,
-                                    'results': results
-                                })
-                        else:
-                            logger.error(f"Ошибка поиска в заявке {app_id}: {response.text}")
+                            return results
+
+                        logger.error(f"Ошибка поиска в заявке {app_id}: {response.text}")
                     except Exception as e:
                         logger.error(f"Ошибка при поиске в заявке {app_id}: {e}")
-                
+                    return []
+
+                if use_reranker:
+                    # Ререйтинг выполняется на GPU в FastAPI, поэтому параллельные запросы
+                    # конкурировали бы за видеопамять - отправляем их по очереди
+                    results_per_app = [search_in_application(app_id) for app_id in search_app_ids]
+                else:
+                    # Запросы по заявкам независимы, поэтому отправляем их параллельно,
+                    # но не больше MAX_PARALLEL_SEARCHES одновременно.
+                    # executor.map возвращает результаты в порядке заявок
+                    max_workers = min(len(search_app_ids), MAX_PARALLEL_SEARCHES)
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        results_per_app = list(executor.map(search_in_application, search_app_ids))
+
+                # Сохраняем результаты с информацией о заявке
+                search_results_by_app = [
+                    {'application_id': app_id, 'results': results}
+                    for app_id, results in zip(search_app_ids, results_per_app)
+                    if results
+                ]
+
                 # Собираем все результаты последовательно по заявкам
                 search_results = []
                 for app_data in search_results_by_app:
                     search_results.extend(app_data['results'])
             else:
                 # Одиночный поиск
-                response = requests.post(f"{FASTAPI_URL}/search", json={
+                response = get_http_session().post(f"{fastapi_url}/search", json={
                     "application_id": str(search_app_ids[0]),
                     "query": query_text_lower,
                     "limit": limit,
@@ -184,13 +215,13 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
                 })
 
                 # Форматируем контекст
-                context = format_documents_for_context(search_results)
+                context = format_documents_for_context(search_results, max_docs=8)
 
                 # Проверяем отмену перед вызовом LLM
                 check_if_cancelled()
 
                 # Вызываем LLM через FastAPI
-                llm_response = requests.post(f"{FASTAPI_URL}/llm/process", json={
+                llm_response = get_http_session().post(f"{fastapi_url}/llm/process", json={
                     "model_name": llm_params.get('model_name', 'gemma3:27b'),
                     "prompt": llm_params.get('prompt_template', ''),
                     "context": context,
@@ -232,7 +263,8 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
                     else:
                         app_position += 1
                     
-                    doc_id = result.get('metadata', {}).get('document_id', '')
+                    metadata = result.get('metadata', {})
+                    doc_id = metadata.get('document_id', '')
                     formatted_result = {
                         'position': app_position,  # Позиция внутри заявки
                         'global_position': i + 1,  # Глобальная позиция
@@ -240,30 +272,31 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
                         'text': result.get('text', ''),
                         'document_id': doc_id,
                         'document_name': doc_names_mapping.get(doc_id, 'Неизвестный документ'),
-                        'page_number': result.get('metadata', {}).get('page_number', 'Не указана'),
+                        'page_number': metadata.get('page_number', 'Не указана'),
                         'score': round(float(result.get('score', 0.0)), 4),
                         'search_type': result.get('search_type', 'vector'),
                         'metadata': {
-                            'section': result.get('metadata', {}).get('section'),
-                            'content_type': result.get('metadata', {}).get('content_type')
+                            'section': metadata.get('section'),
+                            'content_type': metadata.get('content_type')
                         }
                     }
                     formatted_results.append(formatted_result)
             else:
                 # Одиночный поиск - стандартное форматирование
                 for i, result in enumerate(search_results):
-                    doc_id = result.get('metadata', {}).get('document_id', '')
+                    metadata = result.get('metadata', {})
+                    doc_id = metadata.get('document_id', '')
                     formatted_result = {
                         'position': i + 1,
                         'text': result.get('text', ''),
                         'document_id': doc_id,
                         'document_name': doc_names_mapping.get(doc_id, 'Неизвестный документ'),
-                        'page_number': result.get('metadata', {}).get('page_number', 'Не указана'),
+                        'page_number': metadata.get('page_number', 'Не указана'),
                         'score': round(float(result.get('score', 0.0)), 4),
                         'search_type': result.get('search_type', 'vector'),
                         'metadata': {
-                            'section': result.get('metadata', {}).get('section'),
-                            'content_type': result.get('metadata', {}).get('content_type')
+                            'section': metadata.get('section'),
+                            'content_type': metadata.get('content_type')
                         }
                     }
 
@@ -334,66 +367,3 @@ def semantic_search_task(self, application_id=None, application_ids=None, query_
             }
             self.update_state(state='FAILURE', meta=error_result)
             return error_result
-
-
-def format_documents_for_context(documents, max_docs=8):
-    """Форматирует документы для контекста с полными метаданными"""
-    formatted = []
-    for i, doc in enumerate(documents[:max_docs]):
-        text = doc.get('text', '')
-        metadata = doc.get('metadata', {})
-
-        # Формируем заголовок с метаданными
-        doc_text = f"===== Результат {i + 1} =====\n"
-        doc_text += f"[Источник: "
-
-        # Добавляем название документа
-        if metadata.get('document_name'):
-            doc_text += f"Документ: {metadata['document_name']}"
-        elif metadata.get('document_id'):
-            doc_text += f"Документ ID: {metadata['document_id']}"
-
-        # Добавляем страницу
-        if metadata.get('page_number'):
-            doc_text += f", Страница: {metadata['page_number']}"
-        elif metadata.get('page_numbers'):
-            pages = metadata['page_numbers']
-            if isinstance(pages, list) and pages:
-                doc_text += f", Страницы: {', '.join(map(str, pages))}"
-
-        # Добавляем номер чанка
-        if metadata.get('chunk_index') is not None:
-            doc_text += f", Чанк: {metadata['chunk_index']}"
-        elif metadata.get('chunk_id'):
-            doc_text += f", Чанк: {metadata['chunk_id']}"
-
-        # Раздел убран из вывода для упрощения контекста
-
-        doc_text += "]\n\n"
-
-        # Добавляем текст
-        doc_text += f"{text}\n"
-        doc_text += "=" * 30 + "\n"
-
-        formatted.append(doc_text)
-
-    return "\n".join(formatted)
-
-
-def extract_value_from_response(response, query):
-    """Извлекает значение из ответа LLM с поддержкой различных форматов"""
-    parser = LLMResponseParser()
-    result = parser.parse_response(response, query)
-
-    # Логируем результат парсинга для отладки
-    logger.debug(f"Парсинг ответа LLM: формат={result.get('format')}, уверенность={result.get('confidence')}")
-    if 'formats_tried' in result:
-        logger.debug(f"Попробованные форматы: {result['formats_tried']}")
-
-    return result['value']
-
-
-def calculate_confidence(response):
-    """Рассчитывает уверенность в ответе"""
-    parser = LLMResponseParser()
-    return parser._calculate_confidence(response)
\ No newline at end of file
@@ -5,6 +5,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Маркер отсутствующего атрибута (metadata может быть равна None)
+_MISSING = object()
+
 
 def calculate_chunks_total_size(search_results):
     """
@@ -42,25 +45,24 @@ def calculate_chunks_total_size(search_results):
                     total_size += len(text)
             else:
                 # Если chunk - это объект, пробуем через атрибуты
-                # Пробуем получить metadata как атрибут
-                if hasattr(chunk, 'metadata'):
-                    metadata = chunk.metadata
-                    if hasattr(metadata, 'content_length') and metadata.content_length is not None:
-                        try:
-                            total_size += int(metadata.content_length)
-                            continue
-                        except (ValueError, TypeError):
-                            logger.warning(f"Некорректное значение content_length: {metadata.content_length}")
-                    elif isinstance(metadata, dict) and 'content_length' in metadata:
-                        try:
-                            total_size += int(metadata['content_length'])
-                            continue
-                        except (ValueError, TypeError):
-                            logger.warning(f"Некорректное значение content_length: {metadata['content_length']}")
+                metadata = getattr(chunk, 'metadata', None)
+                if isinstance(metadata, dict):
+                    content_length = metadata.get('content_length')
+                else:
+                    content_length = getattr(metadata, 'content_length', None)
+
+                if content_length is not None:
+                    try:
+                        total_size += int(content_length)
+                        continue
+                    except (ValueError, TypeError):
+                        logger.warning(f"Некорректное значение content_length: {content_length}")
 
                 # Если нет content_length, используем текст
-                if hasattr(chunk, 'text') and chunk.text:
-                    total_size += len(chunk.text)
+                try:
+                    total_size += len(chunk.text or '')
+                except (AttributeError, TypeError):
+                    pass
 
         except Exception as e:
             logger.error(f"Ошибка при подсчете размера чанка: {e}")
@@ -76,6 +78,75 @@ def calculate_chunks_total_size(search_results):
     return total_size
 
 
+def format_chunk_source(metadata):
+    """
+    Формирует строку с источником чанка для контекста LLM
+
+    Args:
+        metadata: Метаданные чанка
+
+    Returns:
+        str: Строка вида "[Источник: Документ: ..., Страница: ..., Чанк: ...]"
+    """
+    source = "[Источник: "
+
+    # Добавляем название документа
+    if metadata.get('document_name'):
+        source += f"Документ: {metadata['document_name']}"
+    elif metadata.get('document_id'):
+        source += f"Документ ID: {metadata['document_id']}"
+
+    # Добавляем страницу
+    if metadata.get('page_number'):
+        source += f", Страница: {metadata['page_number']}"
+    elif metadata.get('page_numbers'):
+        pages = metadata['page_numbers']
+        if isinstance(pages, list) and pages:
+            source += f", Страницы: {', '.join(map(str, pages))}"
+
+    # Добавляем номер чанка
+    if metadata.get('chunk_index') is not None:
+        source += f", Чанк: {metadata['chunk_index']}"
+    elif metadata.get('chunk_id'):
+        source += f", Чанк: {metadata['chunk_id']}"
+
+    # Раздел убран из вывода для упрощения контекста
+
+    source += "]"
+    return source
+
+
+def format_documents_for_context(documents, max_docs=None):
+    """
+    Форматирует найденные документы для контекста LLM с метаданными
+
+    Args:
+        documents: Список найденных документов
+        max_docs: Максимальное количество документов в контексте (None - все)
+
+    Returns:
+        str: Контекст с пронумерованными результатами
+    """
+    if max_docs is not None:
+        documents = documents[:max_docs]
+
+    context_parts = []
+    for i, doc in enumerate(documents, 1):
+        metadata = doc.get('metadata', {})
+
+        # Формируем заголовок с метаданными
+        doc_text = f"===== Результат {i} =====\n"
+        doc_text += format_chunk_source(metadata) + "\n\n"
+
+        # Добавляем текст
+        doc_text += f"{doc.get('text', '')}\n"
+        doc_text += "=" * 30 + "\n"
+
+        context_parts.append(doc_text)
+
+    return "\n".join(context_parts)
+
+
 def get_chunk_metadata(chunk):
     """
     Извлекает метаданные из чанка
@@ -88,19 +159,22 @@ def get_chunk_metadata(chunk):
     """
     if isinstance(chunk, dict):
         return chunk.get('metadata', {})
-    elif hasattr(chunk, 'metadata'):
-        if isinstance(chunk.metadata, dict):
-            return chunk.metadata
-        else:
-            # Если metadata - это объект, преобразуем в словарь
-            return {
-                'content_length': getattr(chunk.metadata, 'content_length', None),
-                'document_id': getattr(chunk.metadata, 'document_id', None),
-                'page_number': getattr(chunk.metadata, 'page_number', None),
-                'section': getattr(chunk.metadata, 'section', None),
-                'content_type': getattr(chunk.metadata, 'content_type', None),
-            }
-    return {}
+
+    # Атрибут читаем один раз через getattr вместо hasattr и повторных обращений
+    metadata = getattr(chunk, 'metadata', _MISSING)
+    if metadata is _MISSING:
+        return {}
+    if isinstance(metadata, dict):
+        return metadata
+
+    # Если metadata - это объект, преобразуем в словарь
+    return {
+        'content_length': getattr(metadata, 'content_length', None),
+        'document_id': getattr(metadata, 'document_id', None),
+        'page_number': getattr(metadata, 'page_number', None),
+        'section': getattr(metadata, 'section', None),
+        'content_type': getattr(metadata, 'content_type', None),
+    }
 
 
 def get_chunk_text(chunk):
@@ -115,6 +189,4 @@ def get_chunk_text(chunk):
     """
     if isinstance(chunk, dict):
         return chunk.get('text', '')
-    elif hasattr(chunk, 'text'):
-        return chunk.text
-    return ''
\ No newline at end of file
+    return getattr(chunk, 'text', '')
@@ -2,6 +2,15 @@ from app import db
 from app.models import Application, ParameterResult, ChecklistParameter
 
 
+def get_results_by_parameter(application):
+    """Загружает результаты анализа заявки одним запросом: {parameter_id: ParameterResult}"""
+    results_by_parameter = {}
+    for result in ParameterResult.query.filter_by(application_id=application.id).order_by(ParameterResult.id):
+        # Как и .first(), берем первый результат параметра
+        results_by_parameter.setdefault(result.parameter_id, result)
+    return results_by_parameter
+
+
 def save_analysis_results(application_id, results):
     """Сохраняет результаты анализа в БД"""
     application = Application.query.get(application_id)
@@ -14,6 +23,10 @@ def save_analysis_results(application_id, results):
         for param in checklist.parameters:
             params_dict[param.id] = param
 
+    # Загружаем существующие результаты заявки одним запросом,
+    # чтобы не делать отдельный SELECT на каждый параметр
+    existing_results = get_results_by_parameter(application)
+
     for result in results:
         parameter_id = result['parameter_id']
         parameter = params_dict.get(parameter_id)
@@ -25,10 +38,7 @@ def save_analysis_results(application_id, results):
         llm_request_data = result.get('llm_request', {})
 
         # Проверяем, есть ли уже результат для этого параметра
-        existing_result = ParameterResult.query.filter_by(
-            application_id=application_id,
-            parameter_id=parameter_id
-        ).first()
+        existing_result = existing_results.get(parameter_id)
 
         if existing_result:
             # Обновляем существующий результат
@@ -47,5 +57,6 @@ def save_analysis_results(application_id, results):
                 llm_request=llm_request_data
             )
             db.session.add(param_result)
+            existing_results[parameter_id] = param_result
 
     db.session.commit()
\ No newline at end of file
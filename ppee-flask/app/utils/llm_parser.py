@@ -5,6 +5,44 @@ from typing import Union, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Паттерны компилируются один раз при импорте модуля, а не при каждом ответе LLM
+_JSON_BLOCK_PATTERNS = [
+    re.compile(r'```json\s*(.*?)\s*```', re.DOTALL),  # Markdown JSON блок
+    re.compile(r'```\s*(.*?)\s*```', re.DOTALL),       # Обычный код блок
+    re.compile(r'\{[^{}]*\}', re.DOTALL),              # Простой JSON объект
+    re.compile(r'\{.*?\}', re.DOTALL),                 # JSON объект с вложенностью
+]
+
+_RESULT_PREFIX_PATTERNS = [
+    re.compile(pattern, re.MULTILINE | re.IGNORECASE)
+    for pattern in (
+        r'РЕЗУЛЬТАТ:\s*(.+)',
+        r'Результат:\s*(.+)',
+        r'ОТВЕТ:\s*(.+)',
+        r'Ответ:\s*(.+)',
+        r'ЗНАЧЕНИЕ:\s*(.+)',
+        r'Значение:\s*(.+)',
+    )
+]
+
+# Фразы об отсутствии информации. Проверяются обычным поиском подстроки:
+# для нескольких коротких литералов он быстрее, чем альтернация в regex
+_NOT_FOUND_PHRASES = (
+    'информация не найдена',
+    'данные не найдены',
+    'не удалось найти',
+    'отсутствует информация',
+    'нет данных',
+    'не указан',
+    'не определен',
+    'информация отсутствует',
+)
+
+# Маркеры списков объединены в одно выражение: "1. значение", "- значение",
+# "• значение", "* значение". Строка проверяется одним вызовом match
+_STRUCTURED_RE = re.compile(r'^(?:\d+\.|-|•|\*)\s*(.+)$')
+_STRUCTURED_MARKERS = ('-', '•', '*')
+
 
 class LLMResponseParser:
     """
@@ -89,22 +127,18 @@ class LLMResponseParser:
 
     def _is_not_found(self, response: str) -> bool:
         """Проверяет, указывает ли ответ на отсутствие информации"""
-        not_found_patterns = [
-            'информация не найдена',
-            'данные не найдены',
-            'не удалось найти',
-            'отсутствует информация',
-            'нет данных',
-            'не указан',
-            'не определен',
-            'информация отсутствует'
-        ]
         response_lower = response.lower()
-        return any(pattern in response_lower for pattern in not_found_patterns)
+        return any(phrase in response_lower for phrase in _NOT_FOUND_PHRASES)
 
     def _try_parse_json(self, response: str, query: str) -> Optional[Dict[str, Any]]:
         """Пытается распарсить ответ как чистый JSON"""
         self.formats_tried.append('pure_json')
+
+        # Нас интересуют только объект или массив, поэтому обычный текст
+        # отсекаем без дорогого выброса JSONDecodeError
+        if response.lstrip()[:1] not in ('{', '['):
+            return None
+
         try:
             json_data = json.loads(response)
 
@@ -190,16 +224,12 @@ class LLMResponseParser:
         """Пытается найти и извлечь JSON блок из текста"""
         self.formats_tried.append('json_block')
 
-        # Паттерны для поиска JSON блоков
-        json_patterns = [
-            r'```json\s*(.*?)\s*```',  # Markdown JSON блок
-            r'```\s*(.*?)\s*```',       # Обычный код блок
-            r'\{[^{}]*\}',              # Простой JSON объект
-            r'\{.*?\}',                 # JSON объект с вложенностью
-        ]
+        # Без фигурных скобок и блоков кода искать JSON нет смысла
+        if '{' not in response and '```' not in response:
+            return None
 
-        for pattern in json_patterns:
-            matches = re.findall(pattern, response, re.DOTALL)
+        for pattern in _JSON_BLOCK_PATTERNS:
+            matches = pattern.findall(response)
             for match in matches:
                 # Пробуем распарсить найденный блок
                 result = self._try_parse_json(match, query)
@@ -213,17 +243,8 @@ class LLMResponseParser:
         """Пытается найти ответ с префиксом РЕЗУЛЬТАТ:"""
         self.formats_tried.append('result_prefix')
 
-        patterns = [
-            r'РЕЗУЛЬТАТ:\s*(.+)',
-            r'Результат:\s*(.+)',
-            r'ОТВЕТ:\s*(.+)',
-            r'Ответ:\s*(.+)',
-            r'ЗНАЧЕНИЕ:\s*(.+)',
-            r'Значение:\s*(.+)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, response, re.MULTILINE | re.IGNORECASE)
+        for pattern in _RESULT_PREFIX_PATTERNS:
+            match = pattern.search(response)
             if match:
                 value = match.group(1).strip()
                 return {
@@ -239,12 +260,17 @@ class LLMResponseParser:
         """Пытается найти формат 'ключ: значение'"""
         self.formats_tried.append('key_value')
 
+        # Все варианты этого формата требуют двоеточия, без него строки не разбираем
+        if ':' not in response:
+            return None
+
         lines = response.split('\n')
 
-        # Сначала ищем точное совпадение с query
-        query_pattern = re.escape(query)
+        # Сначала ищем точное совпадение с query.
+        # Паттерн зависит от запроса, поэтому компилируем его один раз на вызов, а не на строку
+        query_re = re.compile(f'{re.escape(query)}\\s*:\\s*(.+)', re.IGNORECASE)
         for line in lines:
-            match = re.search(f'{query_pattern}\\s*:\\s*(.+)', line, re.IGNORECASE)
+            match = query_re.search(line)
             if match:
                 value = match.group(1).strip()
                 if value and not self._is_not_found(value):
@@ -294,28 +320,21 @@ class LLMResponseParser:
         """Пытается найти структурированный ответ с нумерацией или буллетами"""
         self.formats_tried.append('structured')
 
-        # Паттерны для структурированных ответов
-        patterns = [
-            r'^\d+\.\s*(.+)$',      # 1. значение
-            r'^-\s*(.+)$',          # - значение
-            r'^•\s*(.+)$',          # • значение
-            r'^\*\s*(.+)$',         # * значение
-        ]
-
         lines = response.split('\n')
         structured_values = []
 
         for line in lines:
             line = line.strip()
-            for pattern in patterns:
-                match = re.match(pattern, line)
-                if match:
-                    value = match.group(1).strip()
-                    if value and not self._is_not_found(value):
-                        # Проверяем, относится ли к нашему запросу
-                        if any(word in value.lower() for word in query.lower().split()):
-                            structured_values.append(value)
-                            break
+            # Строки, не начинающиеся с маркера списка, отсекаем без вызова regex
+            if not line or (line[0] not in _STRUCTURED_MARKERS and not line[0].isdigit()):
+                continue
+            match = _STRUCTURED_RE.match(line)
+            if match:
+                value = match.group(1).strip()
+                if value and not self._is_not_found(value):
+                    # Проверяем, относится ли к нашему запросу
+                    if any(word in value.lower() for word in query.lower().split()):
+                        structured_values.append(value)
 
         if structured_values:
             # Если нашли одно значение
@@ -349,12 +368,15 @@ class LLMResponseParser:
         confidence = 0.7  # Базовая уверенность для plain text
         response_lower = response.lower()
 
+        # Фразы ищем за один проход и запоминаем, была ли найдена хоть одна
+        has_uncertainty = False
         for phrase in uncertainty_phrases:
             if phrase in response_lower:
                 confidence -= 0.1
+                has_uncertainty = True
 
         # Увеличиваем уверенность для коротких конкретных ответов
-        if len(response) < 100 and not any(phrase in response_lower for phrase in uncertainty_phrases):
+        if len(response) < 100 and not has_uncertainty:
             confidence += 0.1
 
         return max(0.1, min(confidence, 1.0))
@@ -366,6 +388,13 @@ def extract_value_from_response(response: str, query: str) -> str:
     """
     parser = LLMResponseParser()
     result = parser.parse_response(response, query)
+
+    # Логируем результат парсинга для отладки (f-строки собираем только при включенном DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Парсинг ответа LLM: формат={result.get('format')}, уверенность={result.get('confidence')}")
+        if 'formats_tried' in result:
+            logger.debug(f"Попробованные форматы: {result['formats_tried']}")
+
     return result['value']
 
 